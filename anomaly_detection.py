@@ -1,5 +1,6 @@
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
+from joblib import Memory, parallel_backend
 import pandas as pd
 import numpy as np
 import warnings
@@ -7,6 +8,9 @@ import warnings
 # Suppress warnings that might clutter the output
 warnings.filterwarnings('ignore', category=FutureWarning)
 
+# On-disk cache for the model fit (kept in the git-ignored .cache/ folder)
+mem = Memory('.cache', verbose=0)
+
 print("--- Phase 3: Intermediate Machine Learning (Anomaly Detection) ---")
 
 # --- 1. Data Loading ---
@@ -30,49 +34,85 @@ features = [
     'total_students'          # Center Size (Context)
 ]
 
+# Define the final feature list for scaling (excluding 'total_students' which isn't used as a feature, only for context)
+num_features = [f for f in features if f != 'total_students']
+
 # We include 'state' and use One-Hot Encoding (converting states into numerical columns)
 # This allows the model to learn if being in a specific state makes a center more anomalous.
-df_ml = pd.get_dummies(df_results[features + ['state']], columns=['state'], drop_first=True)
+# Like drop_first, the first state (alphabetically) is the baseline and gets no column.
+state_codes, states = pd.factorize(df_results['state'], sort=True)
 
-# Define the final feature list for scaling (excluding 'total_students' which isn't used as a feature, only for context)
-X_features = df_ml.drop(columns=['total_students']).columns.tolist()
+# Build the final float32 matrix directly, one column at a time, instead of going through
+# an intermediate dummies DataFrame: numeric features first, then the one-hot state block.
+n_num = len(num_features)
+X = np.zeros((len(df_results), n_num + len(states) - 1), dtype=np.float32, order='C')
+for j, col in enumerate(num_features):
+    X[:, j] = df_results[col].to_numpy()
+rows = np.flatnonzero(state_codes > 0)
+X[rows, n_num + state_codes[rows] - 1] = 1.0
 
 
 # --- 3. Data Scaling ---
 
 # Standardizing (scaling) the data is mandatory for Isolation Forest.
 # It prevents features with larger numerical ranges (like Center_v_National_Gap) from dominating the model.
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(df_ml[X_features])
+# copy=False lets the scaler standardize the matrix in place.
+scaler = StandardScaler(copy=False)
+X_scaled = scaler.fit_transform(X)
+
+# Make sure the trees receive C-contiguous float32 input (their internal dtype), so they do not take another copy
+X_scaled = X_scaled.astype(np.float32, order='C', copy=False)
 
 
 # --- 4. Model Training (Isolation Forest) ---
 
-# Initialize the model:
+# Initialize and fit the model:
 # n_estimators=100 is standard.
 # contamination=0.015 means we assume 1.5% of our data points (centers) are true anomalies.
-model = IsolationForest(
+# max_samples caps each tree's training subsample (and so its depth at ceil(log2(max_samples))).
+# n_jobs=-1 spreads the trees across all available cores.
+# The fit is cached on the scaled data and the parameters, so re-runs on unchanged data reuse the model.
+@mem.cache
+def fit_iforest(X_scaled, n_estimators, max_samples, contamination, random_state):
+    """Fits an Isolation Forest to the scaled feature matrix."""
+    model = IsolationForest(
+        n_estimators=n_estimators,
+        max_samples=max_samples,
+        contamination=contamination,
+        n_jobs=-1,
+        random_state=random_state,
+        verbose=0
+    )
+    return model.fit(X_scaled)
+
+# Fit the model to the scaled data
+model = fit_iforest(
+    X_scaled,
     n_estimators=100,
+    max_samples=min(256, X_scaled.shape[0]),
     contamination=0.015,
-    random_state=42,
-    verbose=0
+    random_state=42
 )
 
-# Fit the model to the scaled data
-model.fit(X_scaled)
+# Score every center once with the raw Isolation Forest score.
+# Scoring is run under the threading backend so the trees are evaluated in parallel.
+with parallel_backend('threading', n_jobs=-1):
+    scores_raw = model.score_samples(X_scaled)
 
 # Predict the anomaly classification (-1 = Anomaly, 1 = Normal)
-df_results['Anomaly_Flag'] = model.predict(X_scaled)
+# This is exactly what model.predict() does, without traversing the trees a second time.
+df_results['Anomaly_Flag'] = np.where(scores_raw < model.offset_, -1, 1)
 
 # Calculate the Anomaly Score (lower score = more isolated/anomalous)
-df_results['Anomaly_Score'] = model.decision_function(X_scaled)
+# Shifting by offset_ gives the same values as model.decision_function().
+df_results['Anomaly_Score'] = scores_raw - model.offset_
 
 
 # --- 5. Integrate Results and Output ---
 
 # Convert the numerical flag to a descriptive category
-df_results['Anomaly_Type'] = df_results['Anomaly_Flag'].apply(
-    lambda x: 'Anomalous Center' if x == -1 else 'Normal Center'
+df_results['Anomaly_Type'] = np.where(
+    df_results['Anomaly_Flag'].to_numpy() == -1, 'Anomalous Center', 'Normal Center'
 )
 
 # Display the top 10 most anomalous centers (lowest scores)
@@ -93,4 +133,6 @@ print(df_anomalies[[
 # Save the master file with the ML results for dashboarding
 output_file = r"data\NEET_Master_ML_Data.csv"
 df_results.to_csv(output_file, index=False)
+# Also save a Parquet copy for the Streamlit app, which loads it much faster than the CSV
+df_results.to_parquet(r"data\NEET_Master_ML_Data.parquet", index=False)
 print(f"\n✅ Phase 3 ML Complete! Anomaly results saved to {output_file}")
\ No newline at end of file
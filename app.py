@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -10,15 +11,107 @@ st.set_page_config(
 )
 
 # --- DATA LOADING (Caches data for fast reloading) ---
-@st.cache_data
+
+# Only the columns used by the three pages are loaded
+app_cols = [
+    'state',
+    'city',
+    'center_name',
+    'total_students',
+    'national_average_marks',
+    'state_average_marks',
+    'Center_v_National_Gap',
+    'Center_v_State_Gap',
+    'Ultra_High_Score_Ratio',
+    'Center_Skewness',
+    'Anomaly_Flag',
+    'Anomaly_Score',
+    'Anomaly_Type'
+]
+
+# cache_resource hands every rerun the same object instead of hashing and copying the frame,
+# so the master data must be treated as read-only by the pages
+@st.cache_resource
 def load_data():
     """Loads and preprocesses the final ML-ready data."""
-    df = pd.read_csv('data/NEET_Master_ML_Data.csv')
-    return df
+    # Prefer the (local, git-ignored) Parquet copy written by anomaly_detection.py, but only while it is
+    # at least as new as the tracked CSV; otherwise the CSV has been updated since and is read instead
+    parquet_file = 'data/NEET_Master_ML_Data.parquet'
+    csv_file = 'data/NEET_Master_ML_Data.csv'
+    if os.path.exists(parquet_file) and (
+        not os.path.exists(csv_file) or os.path.getmtime(parquet_file) >= os.path.getmtime(csv_file)
+    ):
+        df = pd.read_parquet(parquet_file, columns=app_cols)
+    else:
+        # The pyarrow engine parses the CSV with multiple threads
+        df = pd.read_csv(csv_file, engine='pyarrow', usecols=app_cols)
+
+    # Downcast before caching so the cached frame (and what Plotly receives) is smaller.
+    # Float columns stay float64: they are shown unformatted in KPIs and hover text, where float32
+    # would print extra digits (e.g. 1.2699999809265137 instead of 1.27).
+    for c in df.select_dtypes('int64').columns:
+        df[c] = pd.to_numeric(df[c], downcast='integer')
+    # Repeated labels are stored as categories ('center_name' is unique per center, so it stays as text)
+    for c in ['state', 'city', 'Anomaly_Type']:
+        df[c] = df[c].astype('category')
+
+    # Rebuild the frame on read-only views of the numeric columns (no data is copied), so an accidental
+    # in-place edit of a numeric column fails loudly instead of silently changing the shared cached data.
+    # The text and category columns are not protected this way.
+    columns = {}
+    for c in df.columns:
+        if pd.api.types.is_numeric_dtype(df[c]):
+            values = df[c].to_numpy()
+            values.flags.writeable = False
+            columns[c] = values
+        else:
+            columns[c] = df[c]
+    return pd.DataFrame(columns, copy=False)
 
 df_master = load_data()
 
 
+# --- PAGE AGGREGATES (Cached so they are not re-sorted on every rerun) ---
+# The leading underscore tells Streamlit not to hash the (large, immutable) master frame;
+# only the small results are cached.
+@st.cache_data
+def top50_by_gap(_df):
+    """Top 50 centers by performance gap against the national average."""
+    # nlargest only partially sorts the frame, which is cheaper than a full sort_values().head()
+    return _df.nlargest(50, 'Center_v_National_Gap')
+
+@st.cache_data
+def anomalies_sorted(_df):
+    """Centers flagged as anomalies, most anomalous (lowest score) first."""
+    return _df[_df['Anomaly_Flag'] == -1].sort_values(by='Anomaly_Score')
+
+@st.cache_data
+def state_options(_df):
+    """Options for the state selector."""
+    return ['All States'] + sorted(_df['state'].unique().tolist())
+
+@st.cache_data
+def anomaly_scatter_data(_df):
+    """Slim frame for the anomaly scatter: every anomaly plus a sample of normal centers."""
+    # Only the plotted/hover columns are sent to the browser, and the normal class is capped at
+    # 5,000 points so the chart stays light no matter how many centers there are
+    df_plot = _df[[
+        'Anomaly_Score',
+        'Center_v_National_Gap',
+        'Anomaly_Type',
+        'center_name',
+        'state',
+        'Ultra_High_Score_Ratio',
+        'Center_Skewness',
+        'total_students'
+    ]]
+    df_anomalous = df_plot[df_plot['Anomaly_Type'] == 'Anomalous Center']
+    df_normal = df_plot[df_plot['Anomaly_Type'] == 'Normal Center']
+    df_normal = df_normal.sample(n=min(5000, len(df_normal)), random_state=0)
+    # Restore the original row order, so Plotly keeps the same trace order (anomalies drawn on top)
+    return pd.concat([df_normal, df_anomalous]).sort_index()
+
+
 # ----------------------------------------------------------------------
 # --- PAGE FUNCTIONS ---
 # ----------------------------------------------------------------------
@@ -31,7 +124,7 @@ def page_overview():
     # --- 1. Key Performance Indicators (KPIs) ---
     national_avg = df_master['national_average_marks'].iloc[0].round(2)
     total_centers = len(df_master)
-    anomaly_count = df_master[df_master['Anomaly_Flag'] == -1].shape[0]
+    anomaly_count = anomalies_sorted(df_master).shape[0]
 
     col1, col2, col3 = st.columns(3)
     col1.metric("National Average Marks", f"{national_avg}")
@@ -44,7 +137,7 @@ def page_overview():
     st.header("Top Performing Centers (Above National Average)")
 
     # Sort data for the chart
-    df_sorted = df_master.sort_values(by='Center_v_National_Gap', ascending=False).head(50)
+    df_sorted = top50_by_gap(df_master)
 
     fig = px.bar(
         df_sorted,
@@ -67,11 +160,13 @@ def page_regional_drilldown():
 
     # --- 1. State Selector ---
     # Create a sidebar selection box for states
-    state_list = ['All States'] + sorted(df_master['state'].unique().tolist())
+    state_list = state_options(df_master)
     selected_state = st.sidebar.selectbox("Select State for Analysis", state_list)
 
     if selected_state != 'All States':
         df_filtered = df_master[df_master['state'] == selected_state]
+        # Drop cities from other states so the box plot only gets traces for this state
+        df_filtered = df_filtered.assign(city=df_filtered['city'].cat.remove_unused_categories())
         st.header(f"Performance Distribution in: {selected_state}")
 
         # Display State-level KPI
@@ -100,7 +195,7 @@ def page_anomaly_detection():
     st.title("🚨 Page 3: Anomaly Detection (ML Results)")
     st.markdown("---")
 
-    df_anomalies = df_master[df_master['Anomaly_Flag'] == -1].sort_values(by='Anomaly_Score')
+    df_anomalies = anomalies_sorted(df_master)
     anomaly_count = df_anomalies.shape[0]
 
     st.header(f"Total Centers Flagged as Anomalies: {anomaly_count}")
@@ -111,7 +206,7 @@ def page_anomaly_detection():
 
     # Visualize the Anomaly Score against the Performance Gap
     fig_scatter = px.scatter(
-        df_master,
+        anomaly_scatter_data(df_master),
         x='Anomaly_Score',
         y='Center_v_National_Gap',
         color='Anomaly_Type', # Use the flag for color